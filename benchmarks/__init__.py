@@ -0,0 +1 @@
+# Offline benchmark suite for cledatatoolkit. Run with `python -m benchmarks.run --help` from the repository root.
@@ -0,0 +1,165 @@
+import pandas as pd
+import numpy as np
+
+# Esri field types for the pandas dtypes used in the synthetic data
+fieldLookup = {
+    'i':'esriFieldTypeInteger',
+    'u':'esriFieldTypeInteger',
+    'f':'esriFieldTypeDouble',
+    'b':'esriFieldTypeSmallInteger',
+    'M':'esriFieldTypeDate',
+}
+
+
+class PropertyMap(dict):
+    """A dictionary whose keys can also be read as attributes, like `arcgis`'s PropertyMap (i.e. `layer.properties.objectIdField`)."""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+class FakeFeatureSet:
+
+    def __init__(self, df, wkid=3734):
+        """An in-process stand-in for `arcgis.features.FeatureSet`, backed by a pandas DataFrame or GeoDataFrame.
+
+        Args:
+            df (DataFrame): Features as a DataFrame. If it is a GeoDataFrame, `to_json` will return GeoJSON.
+            wkid (int, optional): EPSG ID reported in `spatial_reference`. Defaults to 3734.
+        """
+        self.df = df
+        self.spatial_reference = {'wkid':wkid, 'latestWkid':wkid}
+
+    @property
+    def sdf(self):
+        return pd.DataFrame(self.df.drop(columns='geometry', errors='ignore'))
+
+    @property
+    def to_json(self):
+        return self.df.to_json()
+
+    @property
+    def features(self):
+        return self.sdf.to_dict('records')
+
+
+class FakeFeatureLayer:
+
+    def __init__(self, df, oid='OBJECTID', wkid=3734):
+        """An in-process stand-in for `arcgis.features.FeatureLayer`.
+        Every `query` and `edit_features` call is recorded in `FakeFeatureLayer.calls` so benchmarks can count REST round-trips.
+
+        Args:
+            df (DataFrame): The features held by the layer. An OBJECTID field is added if it is missing.
+            oid (str, optional): Name of the OBJECTID field. Defaults to 'OBJECTID'.
+            wkid (int, optional): EPSG ID of the layer. Defaults to 3734.
+        """
+        df = df.copy()
+        if oid not in df.columns:
+            df[oid] = np.arange(1, df.shape[0] + 1)
+        self.df = df
+        self.wkid = wkid
+        self.calls = []
+        fields = [{'name':oid, 'type':'esriFieldTypeOID'}]
+        for name, dtype in df.dtypes.items():
+            if name in (oid, 'geometry'):
+                continue
+            fields.append({'name':name, 'type':fieldLookup.get(dtype.kind, 'esriFieldTypeString')})
+        self.properties = PropertyMap(objectIdField=oid, fields=fields)
+
+    def reset(self):
+        """Clear the recorded calls."""
+        self.calls = []
+
+    def query(self, where=None, **kwargs):
+        """Return every feature in the layer. The `where` clause is recorded but not evaluated."""
+        self.calls.append({'method':'query', 'where':where, 'rows':self.df.shape[0]})
+        return FakeFeatureSet(self.df, self.wkid)
+
+    def edit_features(self, adds=None, updates=None, deletes=None, **kwargs):
+        """Record an edit. Adds are appended to the layer so later queries see them."""
+        n_adds = len(adds.features) if adds is not None else 0
+        n_updates = len(updates.features) if updates is not None else 0
+        self.calls.append({'method':'edit_features', 'adds':n_adds, 'updates':n_updates})
+        if n_adds:
+            oid = self.properties.objectIdField
+            added = pd.DataFrame([getattr(f, 'attributes', f) for f in adds.features])
+            added[oid] = np.arange(self.df[oid].max() + 1, self.df[oid].max() + 1 + n_adds)
+            self.df = pd.concat([self.df, added], ignore_index=True)
+        return {'addResults':[{'success':True}] * n_adds, 'updateResults':[{'success':True}] * n_updates, 'deleteResults':[]}
+
+
+class FakeContentManager:
+
+    def __init__(self, items):
+        self.items = items
+        self.calls = []
+
+    def get(self, itemid):
+        self.calls.append({'method':'get', 'itemid':itemid})
+        return self.items.get(itemid)
+
+
+class FakeItem:
+
+    def __init__(self, itemid, layers=None, tables=None):
+        self.id = itemid
+        self.layers = layers or []
+        self.tables = tables or []
+
+
+class FakeGIS:
+
+    def __init__(self, items=None):
+        """An in-process stand-in for `arcgis.gis.GIS`. Items are looked up from a dictionary of item IDs to `FakeItem`s.
+
+        Args:
+            items (dict, optional): A dictionary of item IDs to `FakeItem`s. Defaults to None.
+        """
+        self.content = FakeContentManager(items or {})
+
+    @property
+    def calls(self):
+        """Every recorded call made through the GIS, including calls made to its layers."""
+        calls = list(self.content.calls)
+        for item in self.content.items.values():
+            for layer in item.layers + item.tables:
+                calls += layer.calls
+        return calls
+
+
+def fake_flwrapper(layer, gis=None, layer_id=0, container_id='fake'):
+    """Build an `FLWrapper` around a `FakeFeatureLayer` without connecting to ArcGIS Online.
+    `FLWrapper.__init__` resolves the FeatureLayerCollection through the REST API, so the attributes it would set are filled in directly.
+
+    Args:
+        layer (FakeFeatureLayer): The layer to wrap.
+        gis (FakeGIS, optional): The GIS the layer belongs to. Defaults to a FakeGIS holding only this layer.
+        layer_id (int, optional): The ID of the layer. Defaults to 0.
+        container_id (str, optional): The item ID of the container. Defaults to 'fake'.
+
+    Returns:
+        FLWrapper: The wrapper, ready for `spatialize` and `upsert`.
+    """
+    from cledatatoolkit.ago_helpers import FLWrapper, esriLookup, sqlLookup
+
+    if gis is None:
+        gis = FakeGIS({container_id:FakeItem(container_id, layers=[layer])})
+    wrapper = FLWrapper.__new__(FLWrapper)
+    wrapper.gis = gis
+    wrapper.container_id = container_id
+    wrapper.container_item = gis.content.items.get(container_id)
+    wrapper.container = wrapper.container_item
+    wrapper.esriLookup = esriLookup
+    wrapper.sqlLookup = sqlLookup
+    wrapper.layer_id = layer_id
+    wrapper.layer = layer
+    wrapper.fs = None
+    wrapper.sdf = None
+    wrapper.gdf = None
+    wrapper.crs = None
+    wrapper.memory_usage = None
+    return wrapper
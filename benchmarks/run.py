@@ -0,0 +1,283 @@
+"""Run the offline benchmark suite against synthetic Cleveland-scale data.
+
+Examples:
+    python -m benchmarks.run --scale 0.05 --output baseline.json
+    python -m benchmarks.run --scale 0.05 --compare baseline.json
+"""
+import argparse
+import gc
+import json
+import platform
+import statistics
+import sys
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timezone
+from importlib import metadata
+from time import perf_counter
+from unittest import mock
+
+from . import synthetic
+from .fake_gis import FakeFeatureLayer, FakeFeatureSet, fake_flwrapper
+
+
+def bench_largest_overlap(data, args):
+    from cledatatoolkit.spatial import largest_overlap
+
+    parcels = data['parcels'].copy()
+    neighborhoods = data['neighborhoods'].copy()
+
+    def run():
+        return largest_overlap(parcels, 'parcelpin', neighborhoods, 'SPANM', 'neighborhood', fix_missing=True)
+    return run, [], parcels.shape[0]
+
+
+def bench_fix_missing_sjoins(data, args):
+    from cledatatoolkit.spatial import fix_missing_sjoins
+
+    #Parcels that fall between neighborhoods are left null for both fields, as if a largest overlap join missed them
+    parcels = data['parcels'].copy()
+    neighborhoods = data['neighborhoods']
+    within = parcels.geometry.representative_point().within(neighborhoods.union_all())
+    parcels['neighborhood'] = None
+    parcels['geoid'] = None
+    parcels.loc[within, ['neighborhood', 'geoid']] = 'MATCHED'
+
+    def run():
+        return fix_missing_sjoins(parcels, neighborhoods, test_join_field=['neighborhood', 'geoid'], real_join_field=['SPANM', 'GEOID'])
+    return run, [], int((~within & (parcels['par_city'] == 'CLEVELAND')).sum())
+
+
+def bench_apportion(data, args):
+    from cledatatoolkit.spatial import apportion, build_aggregator
+
+    block_groups = data['census_areas'].copy()
+    neighborhoods = data['neighborhoods'].drop(columns='GEOID')
+    aggregator = build_aggregator(block_groups, exclude=['GEOID', 'NAME'])
+
+    def run():
+        return apportion(block_groups, neighborhoods, 'SPANM', 'GEOID', aggregator)
+    return run, [], block_groups.shape[0]
+
+
+def bench_optimal_single_location(data, args):
+    from cledatatoolkit.spatial import optimal_single_location
+
+    pois = data['pois']
+    block_groups = data['census_areas']
+    #Half a mile at full scale, shrunk with the extent of the data so some areas are always left without access
+    xmin, _, xmax, _ = block_groups.total_bounds
+    search_distance = (xmax - xmin) / 25
+
+    def run():
+        return optimal_single_location(pois, block_groups, 'UNDER18', search_distance, method='brute')
+    return run, [], block_groups.shape[0]
+
+
+def bench_identify_corp_owner(data, args):
+    from cledatatoolkit.property import identify_corp_owner
+
+    owners = data['parcels']['deeded_owner']
+
+    def run():
+        return identify_corp_owner(owners)
+    return run, [], owners.shape[0]
+
+
+def bench_upsert(data, args):
+    #Half of the features already exist in the layer, the other half are new
+    table = data['parcels'].drop(columns='geometry')
+    half = table.shape[0] // 2
+    layer = FakeFeatureLayer(table.iloc[:half])
+    wrapper = fake_flwrapper(layer)
+    fs = FakeFeatureSet(table)
+
+    def run():
+        #Batches sleep for a second between edits to avoid timeouts, which would dominate the timing
+        with mock.patch('cledatatoolkit.ago_helpers.sleep'):
+            return wrapper.upsert(fs, 'parcelpin', batch_size=args.batch_size)
+    return run, [layer], table.shape[0]
+
+
+BENCHMARKS = {
+    'largest_overlap':bench_largest_overlap,
+    'fix_missing_sjoins':bench_fix_missing_sjoins,
+    'apportion':bench_apportion,
+    'optimal_single_location':bench_optimal_single_location,
+    'identify_corp_owner':bench_identify_corp_owner,
+    'upsert':bench_upsert,
+}
+
+
+def build_data(scale, seed=0):
+    """Generate every synthetic dataset used by the benchmarks.
+
+    Args:
+        scale (float): Fraction of the ~350k county parcels to generate.
+        seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+        dict: Synthetic parcels, neighborhoods, census areas and points of interest.
+    """
+    parcels = synthetic.parcels(scale, seed=seed)
+    return {
+        'parcels':parcels,
+        'neighborhoods':synthetic.reference_geographies(parcels),
+        'census_areas':synthetic.census_areas(parcels, n_areas=max(int(1000 * scale), 16), seed=seed),
+        'pois':synthetic.points_of_interest(parcels, seed=seed),
+    }
+
+
+def measure(setup, data, args):
+    """Time a benchmark, then run it once more under `tracemalloc` to get peak memory and API-call counts.
+    Every run gets a fresh setup so benchmarks that modify their inputs measure the same work each time.
+    Note that `tracemalloc` only sees memory allocated through Python and numpy, not GEOS.
+
+    Args:
+        setup (function): A benchmark setup function from `BENCHMARKS`.
+        data (dict): Synthetic data from `build_data`.
+        args (Namespace): Parsed command line arguments.
+
+    Returns:
+        dict: Timings in seconds, peak memory in bytes, API-call counts and the number of rows processed.
+    """
+    timings = []
+    for _ in range(args.repeat):
+        run, layers, rows = setup(data, args)
+        gc.collect()
+        start = perf_counter()
+        run()
+        timings.append(perf_counter() - start)
+
+    run, layers, rows = setup(data, args)
+    gc.collect()
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    calls = Counter(call['method'] for layer in layers for call in layer.calls)
+
+    return {
+        'rows':rows,
+        'seconds':min(timings),
+        'seconds_median':statistics.median(timings),
+        'peak_bytes':peak,
+        'api_calls':dict(calls),
+    }
+
+
+def compare(results, baseline, threshold, min_seconds=0.05, expected=None):
+    """Compare results to a baseline from an earlier run.
+
+    Args:
+        results (dict): Results from this run.
+        baseline (dict): Results loaded from a previous `--output` file.
+        threshold (float): Ratio of new to baseline time or memory above which a benchmark counts as a regression.
+        min_seconds (float, optional): A benchmark must also be this many seconds slower than the baseline for its time to count as a regression,
+            so timing noise on small runs is ignored. Defaults to 0.05.
+        expected (list, optional): Names of the benchmarks that were meant to run. Baseline entries among them that are missing from `results` count as regressions.
+            Defaults to every benchmark in the baseline.
+
+    Returns:
+        list: A list of strings describing every regression found.
+    """
+    regressions = []
+    for name in baseline['results']:
+        if name in results:
+            continue
+        if expected is None or name in expected:
+            regressions.append(f"{name}: in the baseline but did not run")
+        else:
+            print(f"{name:<26} not selected")
+    for name, result in results.items():
+        old = baseline['results'].get(name)
+        if 'error' in result:
+            #Only a benchmark that used to succeed counts as a regression
+            if old is None or 'error' in old:
+                print(f"{name:<26} still failing ({result['error']})")
+            else:
+                regressions.append(f"{name}: failed with {result['error']}")
+            continue
+        if old is None or 'error' in old:
+            print(f"{name:<26} no baseline")
+            continue
+        time_ratio = result['seconds'] / old['seconds'] if old['seconds'] else float('inf')
+        memory_ratio = result['peak_bytes'] / old['peak_bytes'] if old['peak_bytes'] else float('inf')
+        print(f"{name:<26} time x{time_ratio:.2f}  peak memory x{memory_ratio:.2f}")
+        if time_ratio > threshold and result['seconds'] - old['seconds'] > min_seconds:
+            regressions.append(f"{name}: {old['seconds']:.3f}s -> {result['seconds']:.3f}s")
+        if memory_ratio > threshold:
+            regressions.append(f"{name}: {old['peak_bytes']:,} -> {result['peak_bytes']:,} peak bytes")
+        for method, count in result['api_calls'].items():
+            if count > old['api_calls'].get(method, 0):
+                regressions.append(f"{name}: {old['api_calls'].get(method, 0)} -> {count} {method} calls")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=float, default=0.01, help='Fraction of the ~350k county parcels to generate. Defaults to 0.01.')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of timed runs per benchmark, the fastest is reported. Defaults to 3.')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the synthetic data. Defaults to 0.')
+    parser.add_argument('--batch-size', type=int, default=1000, help='batch_size passed to FLWrapper.upsert. Defaults to 1000.')
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), help='Only run these benchmarks.')
+    parser.add_argument('--output', help='Write results to this JSON file, to be used as a baseline later.')
+    parser.add_argument('--compare', help='Compare results to a baseline JSON file and exit with status 1 on regressions.')
+    parser.add_argument('--threshold', type=float, default=1.10, help='Ratio to the baseline that counts as a regression. Defaults to 1.10.')
+    parser.add_argument('--min-seconds', type=float, default=0.05, help='A benchmark must also be this many seconds slower than the baseline to count as a time regression. Defaults to 0.05.')
+    args = parser.parse_args(argv)
+
+    data = build_data(args.scale, seed=args.seed)
+    results = {}
+    for name in args.only or BENCHMARKS:
+        try:
+            results[name] = measure(BENCHMARKS[name], data, args)
+        except ImportError as e:
+            #ago_helpers needs the arcgis package, which is not always installed. Any other missing module is a broken environment.
+            if (e.name or '').split('.')[0] != 'arcgis':
+                raise
+            print(f"{name:<26} skipped ({e})")
+            continue
+        except Exception as e:
+            #A failing benchmark is reported but does not stop the others
+            results[name] = {'error':f"{type(e).__name__}: {e}"}
+            print(f"{name:<26} failed ({results[name]['error']})")
+            continue
+        result = results[name]
+        print(f"{name:<26} {result['rows']:>9,} rows  {result['seconds']:8.3f}s  {result['peak_bytes'] / 2**20:9.1f} MiB peak  {result['api_calls']}")
+
+    try:
+        version = metadata.version('cle-data-toolkit')
+    except metadata.PackageNotFoundError:
+        version = 'unknown'
+    output = {
+        'meta':{
+            'version':version,
+            'scale':args.scale,
+            'seed':args.seed,
+            'repeat':args.repeat,
+            'batch_size':args.batch_size,
+            'python':platform.python_version(),
+            'created':datetime.now(timezone.utc).isoformat(),
+        },
+        'results':results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline['meta']['scale'] != args.scale:
+            print(f"Warning: baseline was run at scale {baseline['meta']['scale']}, this run is at scale {args.scale}")
+        regressions = compare(results, baseline, args.threshold, args.min_seconds, expected=args.only or list(BENCHMARKS))
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,155 @@
+import geopandas as gpd
+import pandas as pd
+import numpy as np
+import shapely
+
+# Synthetic data is generated in Ohio State Plane North (feet), the same coordinate system as most Cuyahoga County layers.
+CRS = "EPSG:3734"
+# Roughly the south-west corner of Cuyahoga County in EPSG:3734
+ORIGIN = (2_150_000, 590_000)
+# Number of parcels in the county parcel layer, used when scale=1
+COUNTY_PARCELS = 350_000
+
+first_names = ["JOHN", "MARY", "JAMES", "LINDA", "ROBERT", "ANGELA", "DARNELL", "MARIA", "KEVIN", "TANISHA", "MICHAEL", "ROSA"]
+last_names = ["SMITH", "JOHNSON", "WILLIAMS", "BROWN", "JONES", "GARCIA", "KOWALSKI", "NOVAK", "WASHINGTON", "RIVERA", "HOLMES", "PETERS"]
+corp_words = ["LAKESHORE", "BUCKEYE", "CUYAHOGA", "FOREST CITY", "ERIE", "SUPERIOR", "EUCLID", "DETROIT SHOREWAY", "SLAVIC VILLAGE", "HOUGH"]
+corp_suffixes = ["LLC", "L.L.C.", "INC", "CORP", "PROPERTIES LLC", "INVESTMENTS LTD", "REAL ESTATE LP", "HOLDINGS TRUST", "DEVELOPMENT CO"]
+other_cities = ["LAKEWOOD", "PARMA", "EUCLID", "SHAKER HEIGHTS", "CLEVELAND HEIGHTS", "GARFIELD HEIGHTS", "EAST CLEVELAND"]
+
+
+def _grid(n_cells, cell_size, shrink=0, jitter=None):
+    """Build a square grid of `n_cells` polygons starting at `ORIGIN`.
+
+    Args:
+        n_cells (int): Number of cells in the grid.
+        cell_size (float): Width of every cell in feet.
+        shrink (float, optional): Distance in feet to pull every cell edge inwards, leaving gaps between cells. Defaults to 0.
+        jitter (array, optional): An (n_cells, 2) array of x and y offsets in feet to move every cell by. Defaults to None.
+
+    Returns:
+        tuple: A GeoSeries of the cells and the number of cells per row.
+    """
+    per_row = int(np.ceil(np.sqrt(n_cells)))
+    idx = np.arange(n_cells)
+    xmin = ORIGIN[0] + (idx % per_row) * cell_size + shrink
+    ymin = ORIGIN[1] + (idx // per_row) * cell_size + shrink
+    if jitter is not None:
+        xmin = xmin + jitter[:, 0]
+        ymin = ymin + jitter[:, 1]
+    geoms = shapely.box(xmin, ymin, xmin + cell_size - 2 * shrink, ymin + cell_size - 2 * shrink)
+    return gpd.GeoSeries(geoms, crs=CRS), per_row
+
+
+def owner_names(n, corp_share=0.3, seed=0):
+    """Generate a Series of deeded owner names in the style of the Cuyahoga County Auditor's data.
+
+    Args:
+        n (int): Number of owner names.
+        corp_share (float, optional): Share of names that look like corporate owners. Defaults to 0.3.
+        seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+        Series: A pandas Series of owner names.
+    """
+    rng = np.random.default_rng(seed)
+    people = (pd.Series(rng.choice(last_names, n)) + " " + pd.Series(rng.choice(first_names, n)))
+    corps = (pd.Series(rng.choice(corp_words, n)) + " " + pd.Series(rng.choice(corp_suffixes, n)))
+    names = people.where(rng.random(n) >= corp_share, corps)
+    # Some owner values are missing in the source data
+    names[rng.random(n) < 0.01] = None
+    return names
+
+
+def parcels(scale=1.0, parcel_size=100, seed=0):
+    """Generate synthetic parcel polygons at Cuyahoga County scale.
+    Parcels sit on a jittered grid, those in the north-east half are attributed to Cleveland in `par_city`.
+
+    Args:
+        scale (float, optional): Fraction of the ~350k county parcels to generate. Defaults to 1.0.
+        parcel_size (int, optional): Width of a parcel in feet. Defaults to 100.
+        seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+        GeoDataFrame: Parcels with `parcelpin`, `par_city`, `tax_luc`, `deeded_owner`, `certified_tax_total` and `population` fields.
+    """
+    rng = np.random.default_rng(seed)
+    n = max(int(COUNTY_PARCELS * scale), 1)
+    # Jitter parcels so they do not line up perfectly with reference geographies
+    geoms, per_row = _grid(n, parcel_size, jitter=rng.uniform(-parcel_size / 8, parcel_size / 8, (n, 2)))
+    idx = np.arange(n)
+    in_cleveland = (idx % per_row) + (idx // per_row) >= per_row
+    par_city = np.where(in_cleveland, "CLEVELAND", rng.choice(other_cities, n))
+    return gpd.GeoDataFrame(
+        {
+            "parcelpin": pd.Series(idx).map("{:09d}".format),
+            "par_city": par_city,
+            "tax_luc": rng.choice([5100, 5200, 4000, 6400, 6800, 4480], n),
+            "deeded_owner": owner_names(n, seed=seed),
+            "certified_tax_total": rng.gamma(2, 40_000, n).round(2),
+            "population": rng.poisson(2.4, n),
+        },
+        geometry=geoms,
+        crs=CRS,
+    )
+
+
+def reference_geographies(parcel_gdf, n_areas=34, name_field="SPANM", gap=150):
+    """Generate reference geographies (i.e. neighborhoods or wards) covering a set of parcels.
+    Areas are shrunk by `gap` so parcels along their edges fall between areas, which is what `fix_missing_sjoins` has to repair.
+
+    Args:
+        parcel_gdf (GeoDataFrame): Parcels from `parcels()`.
+        n_areas (int, optional): Number of areas. Defaults to 34, the number of Cleveland neighborhoods.
+        name_field (str, optional): Name of the area name field. Defaults to "SPANM".
+        gap (float, optional): Distance in feet to leave between areas. Defaults to 150.
+
+    Returns:
+        GeoDataFrame: Reference areas with a `name_field` and a `GEOID` field.
+    """
+    xmin, ymin, xmax, ymax = parcel_gdf.total_bounds
+    per_row = int(np.ceil(np.sqrt(n_areas)))
+    cell_size = max(xmax - xmin, ymax - ymin) / per_row
+    geoms, _ = _grid(n_areas, cell_size, shrink=gap / 2)
+    geoms = geoms.translate(xmin - ORIGIN[0], ymin - ORIGIN[1])
+    return gpd.GeoDataFrame(
+        {name_field: [f"AREA {i:03d}" for i in range(n_areas)], "GEOID": [f"39035{i:06d}" for i in range(n_areas)]},
+        geometry=geoms,
+        crs=CRS,
+    )
+
+
+def census_areas(parcel_gdf, n_areas=1000, seed=0):
+    """Generate census-style areas (i.e. block groups) with estimate and Margin of Error fields.
+
+    Args:
+        parcel_gdf (GeoDataFrame): Parcels from `parcels()`.
+        n_areas (int, optional): Number of areas. Defaults to 1000, roughly the number of block groups in the county.
+        seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+        GeoDataFrame: Areas with `GEOID`, `TOTPOP`, `TOTPOP_M`, `UNDER18` and `UNDER18_M` fields.
+    """
+    rng = np.random.default_rng(seed)
+    areas = reference_geographies(parcel_gdf, n_areas=n_areas, name_field="NAME", gap=0)
+    areas["TOTPOP"] = rng.poisson(900, n_areas).astype(np.float64)
+    areas["TOTPOP_M"] = (areas["TOTPOP"] * rng.uniform(0.05, 0.3, n_areas)).round(0)
+    areas["UNDER18"] = (areas["TOTPOP"] * rng.uniform(0.1, 0.35, n_areas)).round(0)
+    areas["UNDER18_M"] = (areas["UNDER18"] * rng.uniform(0.1, 0.5, n_areas)).round(0)
+    return areas
+
+
+def points_of_interest(parcel_gdf, n_points=25, seed=0):
+    """Generate random point locations (i.e. libraries or recreation centers) within the extent of a set of parcels.
+
+    Args:
+        parcel_gdf (GeoDataFrame): Parcels from `parcels()`.
+        n_points (int, optional): Number of points. Defaults to 25.
+        seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+        GeoDataFrame: Points with a `name` field.
+    """
+    rng = np.random.default_rng(seed)
+    xmin, ymin, xmax, ymax = parcel_gdf.total_bounds
+    geoms = shapely.points(rng.uniform(xmin, xmax, n_points), rng.uniform(ymin, ymax, n_points))
+    return gpd.GeoDataFrame({"name": [f"POI {i}" for i in range(n_points)]}, geometry=geoms, crs=CRS)
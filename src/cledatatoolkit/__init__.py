@@ -2,4 +2,5 @@
 # This requires importing top-level package once `cledatatoolkit`, where you access these inner modules keeping it clear where they come from
 from . import spatial
 from . import property
-from . import census
\ No newline at end of file
+from . import census
+from . import instrument
\ No newline at end of file
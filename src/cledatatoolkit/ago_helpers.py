@@ -1,9 +1,10 @@
 import pandas as pd
 import geopandas as gpd
-import numpy as np
 
 from time import sleep
 
+from .instrument import stage
+
 from arcgis.gis import GIS
 from arcgis.features import managers
 from arcgis.features import FeatureSet
@@ -32,6 +33,54 @@ sqlLookup = {
     'int':'sqlTypeInteger',
     'bigint':'esriFieldTypeInteger'
 }
+#Lookup for how Esri numeric field types can be downcast in memory. Doubles are left alone since downcasting them loses precision,
+#and OBJECTIDs are left alone since edits and joins key on them.
+downcastLookup = {
+    'esriFieldTypeSmallInteger':'integer',
+    'esriFieldTypeInteger':'integer',
+    'esriFieldTypeSingle':'float'
+}
+
+
+def compact_dataframe(df, fields, category_ratio=0.5):
+    """Shrink the in-memory footprint of a DataFrame using the Esri field types of the FeatureLayer it came from.
+    String fields with few unique values (i.e. `par_city` or land use codes) are converted to categoricals, and integer and single fields are downcast to the smallest numeric type that holds their values.
+    OBJECTID and double fields keep their original types.
+
+    Args:
+        df (DataFrame): A pandas DataFrame or GeoDataFrame queried from a FeatureLayer.
+        fields (list): A list of field dictionaries from the FeatureLayer's Service Definition, i.e. `FeatureLayer.properties['fields']`.
+        category_ratio (float, optional): String fields whose ratio of unique values to rows is at or below this number are converted to categoricals. Defaults to 0.5.
+
+    Returns:
+        DataFrame: The compacted DataFrame. The input DataFrame is modified in place.
+    """
+    rows = df.shape[0]
+
+    for field in fields:
+        name = field['name']
+        if name not in df.columns:
+            continue
+        column = df[name]
+
+        #Low-cardinality strings become categoricals
+        if field['type'] == 'esriFieldTypeString':
+            if rows > 0 and column.nunique() / rows <= category_ratio:
+                df[name] = column.astype('category')
+
+        #Numeric fields are downcast based on their Esri field type
+        elif field['type'] in downcastLookup:
+            how = downcastLookup[field['type']]
+            #Floats can hold NaN, so single fields are always downcast
+            if how == 'float' or not column.hasnans:
+                df[name] = pd.to_numeric(column, downcast=how)
+            #Integer columns with nulls can only be downcast to a nullable integer type, as long as every value is a whole number
+            else:
+                values = pd.to_numeric(column.dropna(), downcast=how)
+                if pd.api.types.is_integer_dtype(values.dtype):
+                    df[name] = column.astype(values.dtype.name.capitalize())
+
+    return df
 
 
 class FLCWrapper:
@@ -56,8 +105,9 @@ class FLCWrapper:
     def update_container(self):
         """Refresh the connection to the FeatureLayerCollection.
         """
-        self.container_item = self.gis.content.get(self.container_id)
-        self.container=FeatureLayerCollection.fromitem(self.container_item)
+        with stage("update_container", connection=self.gis):
+            self.container_item = self.gis.content.get(self.container_id)
+            self.container=FeatureLayerCollection.fromitem(self.container_item)
 
 
     def get_layer(self, id:int):
@@ -254,29 +304,84 @@ class FLWrapper(FLCWrapper):
         elif how.lower()=="table":
             self.layer = self.get_table(self.layer_id)
 
-    def spatialize(self, clause=None):
+        #These are populated by spatialize()
+        self.fs = None
+        self.sdf = None
+        self.gdf = None
+        self.crs = None
+        self.memory_usage = None
+
+    def spatialize(self, clause=None, keep='all', compact=False):
         """Query features from the FeatureLayer. 
         This will initialize the Spatially Enabled DataFrame (`FLWrapper.sdf`) and FeatureSet (`FLWrapper.fs`). 
         This function will also extract the Coordinate Reference System (`FLWrapper.crs`) and build a GeoDataFrame of the features (`FLWrapper.gdf`).
+        For large layers, `keep` can be used to hold only one of these representations in memory, the others are set to `None`.
 
         Args:
             clause (str, optional): A SQL clause for filtering features. Defaults to None.
-        """
-
-        if clause != None:
-            self.fs = self.layer.query(where=clause)
+            keep (str, optional): Either "all", "fs", "sdf" or "gdf". The representation of the features to keep on the wrapper. Defaults to "all".
+            compact (bool, optional): If True, the kept DataFrames are shrunk with `compact_dataframe` and the memory used before and after is recorded in `FLWrapper.memory_usage`. Defaults to False.
 
-        else:
-            self.fs = self.layer.query()
-
-        #Get Spatially Enabled Dataframe
-        self.sdf = self.fs.sdf
-        #Get CRS
-        self.crs = self.fs.spatial_reference['latestWkid']
-        #Build GeoDataFrame
-        geojson = self.fs.to_json
-        self.gdf = gpd.read_file(geojson).set_crs(self.crs)
-        self.gdf['geometry'] = self.gdf.make_valid()
+        Raises:
+            Exception: If the keep parameter is not "all", "fs", "sdf" or "gdf", or `compact` is True with a `keep` of "fs", which has no DataFrame to compact.
+        """
+        keep = keep.lower()
+        if keep not in ('all', 'fs', 'sdf', 'gdf'):
+            raise Exception('You need to identify a `keep` of "all", "fs", "sdf" or "gdf".')
+        if compact and keep == 'fs':
+            raise Exception('A FeatureSet cannot be compacted, use a `keep` of "all", "sdf" or "gdf" with `compact`.')
+
+        #Release the previous query's features before fetching new ones
+        self.fs = None
+        self.sdf = None
+        self.gdf = None
+        self.memory_usage = None
+
+        with stage("spatialize", keep=keep):
+            with stage("query", connection=self.layer) as s:
+                if clause != None:
+                    fs = self.layer.query(where=clause)
+
+                else:
+                    fs = self.layer.query()
+                s.add(rows=len(fs.features))
+
+            #Get CRS
+            self.crs = fs.spatial_reference['latestWkid']
+            #Get Spatially Enabled Dataframe
+            if keep in ('all', 'sdf'):
+                with stage("sdf"):
+                    self.sdf = fs.sdf
+            else:
+                self.sdf = None
+            #Build GeoDataFrame
+            if keep in ('all', 'gdf'):
+                with stage("read_geojson") as s:
+                    geojson = fs.to_json
+                    self.gdf = gpd.read_file(geojson).set_crs(self.crs)
+                    s.add(rows=self.gdf.shape[0], geojson_bytes=len(geojson))
+                    #The GeoJSON text can be as large as the layer itself
+                    del geojson
+                with stage("make_valid", rows=self.gdf.shape[0]):
+                    self.gdf['geometry'] = self.gdf.make_valid()
+            else:
+                self.gdf = None
+            #Only hold on to the FeatureSet if it was asked for, and drop the local reference so it is freed before compacting
+            self.fs = fs if keep in ('all', 'fs') else None
+            del fs
+
+            if compact:
+                fields = self.layer.properties['fields']
+                self.memory_usage = {}
+                for name in ('sdf', 'gdf'):
+                    df = getattr(self, name)
+                    if df is None:
+                        continue
+                    with stage("compact", rows=df.shape[0], frame=name):
+                        before = int(df.memory_usage(deep=True).sum())
+                        compact_dataframe(df, fields)
+                        after = int(df.memory_usage(deep=True).sum())
+                    self.memory_usage[name] = {'before':before, 'after':after}
 
 
     def add_field(self, field_dict:dict):
@@ -353,54 +458,66 @@ class FLWrapper(FLCWrapper):
         Args:
             fs (FeatureSet): A FeatureSet containing features to add and/or update.
             id_field (str): ID Field for which the Upsert is performed.
-            batch_size (int): Recommended for larger datasets. The number of features to upsert per batch. After every batch the system will sleep for one second to avoid a timeout error. If zero the entire dataset will be uploaded in a single batch. Defaults to 0.
+            batch_size (int): Recommended for larger datasets. The number of features to upsert per batch. Every batch holds exactly `batch_size` features except the last, which holds the remainder. After every batch the system will sleep for one second to avoid a timeout error. If zero the entire dataset will be uploaded in a single batch. Defaults to 0.
         """
         #Coerce featureset to pandas dataframe
         df = fs.sdf.set_index(id_field)
-        
-        oid = self.layer.properties.objectIdField
-        #Coerce to layer Pandas DataFrame and get the id_field, if the column doesn't exist, return an empty series.
-        #Furthermore, since OBJECTIDs might not match between dataframes, we need to crosswalk between the OBJECTID field and the id_field identified in the function.
-        try:
-            indices = self.layer.query().sdf[[oid,id_field]].set_index(id_field)
-            #Update OBJECTID from FeatureSet to match OBJECTID from current FeatureLayer
-            df.loc[:,oid] = indices[oid]
-        except KeyError:
-            indices = pd.Series()
-
-        #Helper function for determing adds and updates
-        def partition(df):
-
-            #Get features to add and features to update and features to delete
+
+        with stage("upsert", rows=df.shape[0]):
+            oid = self.layer.properties.objectIdField
+            #Coerce to layer Pandas DataFrame and get the id_field, if the column doesn't exist, return an empty series.
+            #Furthermore, since OBJECTIDs might not match between dataframes, we need to crosswalk between the OBJECTID field and the id_field identified in the function.
             try:
-                to_add = FeatureSet.from_dataframe(df.copy()[df[id_field].isin(indices.index) == False])
-            except KeyError:
-                to_add = None
-            try:    
-                to_update = FeatureSet.from_dataframe(df.copy()[df[id_field].isin(indices.index)])
+                with stage("query", connection=self.layer) as s:
+                    indices = self.layer.query().sdf[[oid,id_field]].set_index(id_field)
+                    s.add(rows=indices.shape[0])
+                #Update OBJECTID from FeatureSet to match OBJECTID from current FeatureLayer
+                df.loc[:,oid] = indices[oid]
             except KeyError:
-                to_update = None
-
-            return to_add, to_update
-
-        #Drop index
-        df.reset_index(inplace=True)
-
-        if batch_size > 0:
-
-            batches = df.shape[0] / batch_size
-
-            #For every batch
-            for batch in np.array_split(df, batches):
-                #Break it up into adds and updates
-                to_add, to_update = partition(batch)
-                #Add to feature service
-                self.layer.edit_features(adds=to_add, updates=to_update)
-                #Sleep for one second to avoid timeout
-                sleep(1)
-        
-        else:
-            #Get all adds and updates for the guy
-            to_add, to_update = partition(df)
-            #Upsert FeatureSet
-            self.layer.edit_features(adds=to_add, updates=to_update)
+                indices = pd.Series()
+
+            #Helper function for determing adds and updates
+            def partition(df):
+
+                with stage("partition", rows=df.shape[0]):
+                    #Get features to add and features to update and features to delete
+                    try:
+                        to_add = FeatureSet.from_dataframe(df.copy()[df[id_field].isin(indices.index) == False])
+                    except KeyError:
+                        to_add = None
+                    try:    
+                        to_update = FeatureSet.from_dataframe(df.copy()[df[id_field].isin(indices.index)])
+                    except KeyError:
+                        to_update = None
+
+                return to_add, to_update
+
+            #Helper function for sending adds and updates to the FeatureLayer
+            def edit(to_add, to_update):
+                with stage("edit_features", connection=self.layer) as s:
+                    self.layer.edit_features(adds=to_add, updates=to_update)
+                    for features in (to_add, to_update):
+                        if features is not None:
+                            s.add(rows=len(features.features))
+
+            #Drop index
+            df.reset_index(inplace=True)
+
+            if batch_size > 0:
+
+                #For every batch of `batch_size` features
+                for start in range(0, df.shape[0], batch_size):
+                    batch = df.iloc[start:start + batch_size]
+                    #Break it up into adds and updates
+                    to_add, to_update = partition(batch)
+                    #Add to feature service
+                    edit(to_add, to_update)
+                    #Sleep for one second to avoid timeout
+                    with stage("sleep"):
+                        sleep(1)
+            
+            else:
+                #Get all adds and updates for the guy
+                to_add, to_update = partition(df)
+                #Upsert FeatureSet
+                edit(to_add, to_update)
@@ -0,0 +1,209 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+import requests
+
+# Callbacks that receive an event dictionary every time an instrumented stage finishes. Instrumentation is off while this is empty.
+# Both variables hold tuples that are replaced rather than mutated, so each thread or task only sees the collectors and stages it started.
+_callbacks = ContextVar("cledatatoolkit_callbacks", default=())
+# Stages currently running, used to build nested stage names like "largest_overlap.overlay" and to attribute REST requests
+_stack = ContextVar("cledatatoolkit_stack", default=())
+
+
+class _NullStage:
+    """Stand-in returned by `stage()` while instrumentation is disabled. It does nothing and is falsy,
+    so expensive measurements can be skipped with `if s:`."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __bool__(self):
+        return False
+
+    def add(self, **counts):
+        pass
+
+
+_null_stage = _NullStage()
+
+
+def _find_session(obj):
+    """Find the `requests.Session` an `arcgis` object sends its requests through.
+    `arcgis` keeps it a few levels down, i.e. `FeatureLayer._con._session._session`.
+
+    Args:
+        obj: A `requests.Session`, or an `arcgis` GIS, FeatureLayer or Connection.
+
+    Returns:
+        requests.Session: The session, or None if one can't be found.
+    """
+    for _ in range(4):
+        if obj is None or isinstance(obj, requests.Session):
+            return obj
+        inner = getattr(obj, "_con", None)
+        obj = inner if inner is not None else getattr(obj, "_session", None)
+    return obj if isinstance(obj, requests.Session) else None
+
+
+def _body_size(headers, body=None):
+    """Size of a request or response body in bytes, from its Content-Length header or, for requests, a bytes or str body.
+    Streamed, generator and file-like bodies are never read, so their size counts as 0 when there is no Content-Length."""
+    try:
+        length = headers.get("Content-Length") if headers is not None else None
+        if length is not None:
+            return int(length)
+        if isinstance(body, bytes):
+            return len(body)
+        if isinstance(body, str):
+            return len(body.encode("utf-8"))
+    except (TypeError, ValueError, UnicodeError):
+        pass
+    return 0
+
+
+def _count_response(response, *args, **kwargs):
+    """`requests` response hook that adds every response to the innermost running stage of the current context.
+    It runs inside the caller's own request, so it must never raise."""
+    try:
+        stack = _stack.get()
+        if stack:
+            request = response.request
+            sent = _body_size(request.headers, request.body) if request is not None else 0
+            stack[-1].add(rest_calls=1, bytes=sent + _body_size(response.headers))
+    except Exception:
+        pass
+
+
+def _watch(connection):
+    """Install the response hook on the session behind `connection`, once per session."""
+    session = _find_session(connection)
+    if session is not None and _count_response not in session.hooks["response"]:
+        session.hooks["response"].append(_count_response)
+
+
+class Stage:
+
+    def __init__(self, name, info, connection=None):
+        """A timed stage of work. Use `stage()` rather than creating these directly.
+
+        Args:
+            name (str): Name of the stage.
+            info (dict): Extra values to include in the emitted event.
+            connection (optional): An `arcgis` object whose REST requests are counted. Defaults to None.
+        """
+        self.name = name
+        self.event = {'rows':0, 'bytes':0, 'rest_calls':0}
+        self.event.update(info)
+        if connection is not None:
+            _watch(connection)
+
+    def __enter__(self):
+        stack = _stack.get()
+        self.event['stage'] = '.'.join([s.name for s in stack] + [self.name])
+        self._token = _stack.set(stack + (self,))
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.event['seconds'] = perf_counter() - self.start
+        _stack.reset(self._token)
+        if exc_type is not None:
+            self.event['error'] = exc_type.__name__
+        for callback in _callbacks.get():
+            callback(self.event)
+        return False
+
+    def add(self, **counts):
+        """Add to the counts of the stage, i.e. `s.add(rows=100)`. Values for new keys are set."""
+        for key, value in counts.items():
+            self.event[key] = self.event.get(key, 0) + value
+
+
+def stage(name, connection=None, **info):
+    """Instrument a stage of work. Used as a context manager around the code being measured.
+    When no collector is active this returns a shared no-op object, so the cost of instrumentation is a single lookup.
+
+    Args:
+        name (str): Name of the stage. Stages nested inside other stages are named after their parents, i.e. "spatialize.make_valid".
+        connection (optional): An `arcgis` GIS or FeatureLayer. Every HTTP request it makes from this thread while the stage is the innermost one running
+            is counted in `rest_calls`, and the request and response bodies in `bytes` when their size is known without reading them. Defaults to None.
+        **info: Extra values to include in the emitted event, such as `rows`.
+
+    Returns:
+        Stage: The running stage, use `Stage.add()` to count rows as they happen.
+    """
+    if not _callbacks.get():
+        return _null_stage
+    return Stage(name, info, connection)
+
+
+def enabled():
+    """Check whether any collector is active.
+
+    Returns:
+        bool: True if instrumented stages are currently being recorded.
+    """
+    return bool(_callbacks.get())
+
+
+@contextmanager
+def collect(callback=None):
+    """Record every instrumented stage run inside the `with` block.
+    Each stage emits a dictionary with the keys `stage`, `seconds`, `rows`, `bytes` and `rest_calls`, plus `error` if the stage raised an exception.
+    Only stages run in the same thread (or asyncio task) as the `with` block are recorded. To collect from worker threads, call `collect()` inside each worker.
+
+    Args:
+        callback (function, optional): Called with each event dictionary as its stage finishes, i.e. to forward it to logging or a metrics client. Defaults to None.
+
+    Yields:
+        list: The list of event dictionaries recorded so far, in the order the stages finished.
+    """
+    events = []
+
+    def record(event):
+        events.append(event)
+        if callback is not None:
+            callback(event)
+
+    token = _callbacks.set(_callbacks.get() + (record,))
+    try:
+        yield events
+    finally:
+        _callbacks.reset(token)
+
+
+def log_events(logger, level=20):
+    """Build a callback for `collect()` that writes each event to a `logging.Logger`.
+
+    Args:
+        logger (logging.Logger): The logger to write to.
+        level (int, optional): The logging level. Defaults to 20 (INFO).
+
+    Returns:
+        function: A callback that logs the event, with the event dictionary attached to the record as `event`.
+    """
+    def callback(event):
+        logger.log(level, "%(stage)s took %(seconds).3fs (%(rows)s rows, %(bytes)s bytes, %(rest_calls)s REST calls)", event, extra={'event':event})
+    return callback
+
+
+def summarize(events):
+    """Total the events recorded by `collect()` per stage.
+
+    Args:
+        events (list): Event dictionaries from `collect()`.
+
+    Returns:
+        dict: A dictionary of stage names to the number of times they ran and their total `seconds`, `rows`, `bytes` and `rest_calls`.
+    """
+    summary = {}
+    for event in events:
+        totals = summary.setdefault(event['stage'], {'count':0, 'seconds':0, 'rows':0, 'bytes':0, 'rest_calls':0})
+        totals['count'] += 1
+        for key in ('seconds', 'rows', 'bytes', 'rest_calls'):
+            totals[key] += event.get(key, 0)
+    return summary
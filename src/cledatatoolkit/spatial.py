@@ -5,6 +5,7 @@ import libpysal
 import shapely
 
 from .census import calc_moe
+from .instrument import stage
 
 # Largest overlap function 1:1 take the biggest overlapping feature
 def largest_overlap(
@@ -17,6 +18,7 @@ def largest_overlap(
     fix_missing=False,
     reference_field="par_city",
     reference_value: str = "CLEVELAND",
+    max_distance: float = None,
 ):
     """Spatial join of the largest overlap between polygons
 
@@ -30,6 +32,10 @@ def largest_overlap(
                                 'string' for best performance
                                 'float64' for float
                                 'int64' for integer
+        fix_missing (bool, optional): Fill rows that should not be null with the nearest polygon, see `fix_missing_sjoins`. Defaults to False.
+        reference_field (str, optional): Passed to `fix_missing_sjoins`. Defaults to "par_city".
+        reference_value (str, optional): Passed to `fix_missing_sjoins`. Defaults to "CLEVELAND".
+        max_distance (float, optional): Passed to `fix_missing_sjoins`. Defaults to None.
 
     Returns:
         gpd.GeoDataFrame
@@ -37,39 +43,43 @@ def largest_overlap(
     # set up new column name based on function parameter
     new_column = f"{new_name}"
 
-    # Formatting the outputs
-    # If you want an integer represented as a string without decimal points
-    if data_type == "int_string":
-        join_gdf[transfer_field] = (
-            join_gdf[transfer_field].astype("Int64").astype("string")
-        )
-    else:
-        join_gdf[transfer_field] = join_gdf[transfer_field].astype(data_type)
-
-    # Intersect two layers
-    intersect_gdf = gpd.overlay(target_gdf, join_gdf, how="intersection")
-
-    # Generate the sq footage of each intersecting area
-    intersect_gdf["sqft_area"] = intersect_gdf.geometry.area
-
-    # Sort by square feet, drop all of each parcel number group except the largest overlap, drop area column
-    intersect_gdf = intersect_gdf.sort_values(by='sqft_area').drop_duplicates(
-        subset=target_key, keep='last').drop('sqft_area', axis=1)
-
-    new_gdf = target_gdf.merge(intersect_gdf[[target_key, transfer_field]], 'left', on=target_key).rename(
-        columns={transfer_field: new_column})
-
-    # Fix sjoins that failed to match but must be filled by definition
-    # e.g. Cleveland parcels that have no neighborhoods assigned
-    if fix_missing:
-        new_gdf = fix_missing_sjoins(
-            target_gdf=new_gdf,
-            join_gdf=join_gdf,
-            reference_field=reference_field,
-            reference_value=reference_value,
-            test_join_field=new_column,
-            real_join_field=transfer_field,
-        )
+    with stage("largest_overlap", rows=target_gdf.shape[0]):
+        # Formatting the outputs
+        # If you want an integer represented as a string without decimal points
+        if data_type == "int_string":
+            join_gdf[transfer_field] = (
+                join_gdf[transfer_field].astype("Int64").astype("string")
+            )
+        else:
+            join_gdf[transfer_field] = join_gdf[transfer_field].astype(data_type)
+
+        # Intersect two layers
+        with stage("overlay") as s:
+            intersect_gdf = gpd.overlay(target_gdf, join_gdf, how="intersection")
+            s.add(rows=intersect_gdf.shape[0])
+
+        # Generate the sq footage of each intersecting area
+        intersect_gdf["sqft_area"] = intersect_gdf.geometry.area
+
+        # Sort by square feet, drop all of each parcel number group except the largest overlap, drop area column
+        intersect_gdf = intersect_gdf.sort_values(by='sqft_area').drop_duplicates(
+            subset=target_key, keep='last').drop('sqft_area', axis=1)
+
+        new_gdf = target_gdf.merge(intersect_gdf[[target_key, transfer_field]], 'left', on=target_key).rename(
+            columns={transfer_field: new_column})
+
+        # Fix sjoins that failed to match but must be filled by definition
+        # e.g. Cleveland parcels that have no neighborhoods assigned
+        if fix_missing:
+            new_gdf = fix_missing_sjoins(
+                target_gdf=new_gdf,
+                join_gdf=join_gdf,
+                reference_field=reference_field,
+                reference_value=reference_value,
+                test_join_field=new_column,
+                real_join_field=transfer_field,
+                max_distance=max_distance,
+            )
     return new_gdf
 
 def fix_missing_sjoins(
@@ -79,21 +89,27 @@ def fix_missing_sjoins(
     reference_value: str = "CLEVELAND",  # Format to match value if attributed to Cleveland
     test_join_field: str = None,  # Field we are validating
     real_join_field: str = None,  # The source field name to grab
+    max_distance: float = None,  # Furthest a fix can be taken from
+    join_index=None,  # Prebuilt spatial index of join_gdf
 ):
-    """Fix spatial joins that should not be null by running sjoin_nearest
-    on records that should logically not be empty. Typical use case is making sure all shapes within Cleveland
-    are successfully joining to geographies that are required for Cleveland property, like ward or neighborhood
+    """Fix spatial joins that should not be null by taking the nearest polygon
+    for records that should logically not be empty. Typical use case is making sure all shapes within Cleveland
+    are successfully joining to geographies that are required for Cleveland property, like ward or neighborhood.
+    Several fields can be fixed at once by passing lists to `test_join_field` and `real_join_field`, the nearest polygon is only searched for once per row.
+    When a row is equally near to several polygons, only one of them is used.
 
     Args:
         gdf: GeoDataFrame = Left geodataframe (usually parcels)
         join_gdf: GeoDataFrame = Right geodataframe (usually reference geography)
         reference_field: str =  Defaults to "par_city" assuming parcels
         reference_value: str = "CLEVELAND", # Format to match value if attributed to Cleveland
-        test_join_field: str = "Neighborhood", Field we are validating
-        real_join_field:str="SPANM"#Thesourcefieldnametograb.
+        test_join_field: str or list = "Neighborhood", Field(s) we are validating
+        real_join_field: str or list = "SPANM", The source field name(s) to grab, in the same order as test_join_field
+        max_distance: float = None, Rows with no polygon within this distance (in the units of the CRS) are left null. Defaults to no limit.
+        join_index: SpatialIndex = None, Prebuilt `join_gdf.sindex` to reuse. Defaults to `join_gdf.sindex`, which geopandas builds once and caches on join_gdf.
 
     Raises:
-        ValueError: If a test field isn't indicated
+        ValueError: If a test field isn't indicated, test and real fields don't pair up, or the CRSs don't match
 
     Returns:
         GeoDataFrame
@@ -102,13 +118,36 @@ def fix_missing_sjoins(
         raise ValueError(
             "You must enter the field you want to test for null, i.e. not being found in something that should be in Cleveland."
         )
-    # Rows that should be in Cleveland but are testing for bad value
-    require_fixes = (target_gdf[reference_field] == reference_value) & (
-        target_gdf[test_join_field].isna()
-    )
-    # Use nearest spatial join to grab these edge cases
-    fix_array = gpd.sjoin_nearest(target_gdf[require_fixes], join_gdf)[real_join_field]
-    target_gdf.loc[require_fixes, test_join_field] = fix_array
+    test_fields = [test_join_field] if isinstance(test_join_field, str) else list(test_join_field)
+    real_fields = [real_join_field] if isinstance(real_join_field, str) else list(real_join_field)
+    if len(test_fields) != len(real_fields):
+        raise ValueError("test_join_field and real_join_field must have the same number of fields.")
+    # Distances are only meaningful when both layers share a coordinate system
+    if target_gdf.crs != join_gdf.crs:
+        raise ValueError(
+            f"target_gdf and join_gdf must have the same CRS, got {target_gdf.crs} and {join_gdf.crs}. Reproject one with to_crs() first."
+        )
+
+    # Rows that should be in Cleveland but are testing for bad value in any field
+    missing = target_gdf[test_fields].isna()
+    require_fixes = (target_gdf[reference_field] == reference_value) & missing.any(axis=1)
+    positions = np.flatnonzero(require_fixes.to_numpy())
+    if positions.size == 0:
+        return target_gdf
+
+    if join_index is None:
+        join_index = join_gdf.sindex
+    # Use one nearest neighbour search to grab these edge cases, return_all=False keeps a single polygon when there are ties
+    with stage("fix_missing_sjoins", rows=positions.size):
+        input_idx, join_idx = join_index.nearest(
+            target_gdf.geometry.values[positions], return_all=False, max_distance=max_distance
+        )
+        rows = positions[input_idx]
+        # Assign by position so duplicate index values on target_gdf don't matter, and only fill fields that are null
+        for test_field, real_field in zip(test_fields, real_fields):
+            fill = missing[test_field].to_numpy()[rows]
+            values = join_gdf[real_field].to_numpy()[join_idx]
+            target_gdf.iloc[rows[fill], target_gdf.columns.get_loc(test_field)] = values[fill]
     return target_gdf
 
 
@@ -159,9 +198,12 @@ def apportion(left,right,group_key,target_key,aggregator):
         GeoDataFrame: An apportioned GeoDataFrame, containing all fields from `right`, and aggregated fields from `left`.
     """
 
-    join = largest_overlap(target_gdf=left,target_key=target_key,join_gdf=right,transfer_field=group_key,new_name=group_key)
-    grouped = join.groupby(group_key).agg(aggregator).round(2)
-    final = gpd.GeoDataFrame(grouped.merge(right,how='left',left_index=True, right_on=group_key),geometry='geometry',crs=right.crs)
+    with stage("apportion", rows=left.shape[0]):
+        join = largest_overlap(target_gdf=left,target_key=target_key,join_gdf=right,transfer_field=group_key,new_name=group_key)
+        with stage("aggregate") as s:
+            grouped = join.groupby(group_key).agg(aggregator).round(2)
+            s.add(rows=grouped.shape[0])
+        final = gpd.GeoDataFrame(grouped.merge(right,how='left',left_index=True, right_on=group_key),geometry='geometry',crs=right.crs)
     return final
 
 
@@ -195,38 +237,39 @@ def optimal_single_location(poi_gdf: gpd.GeoDataFrame,
             total_gain: int, the total sum of your 
     """
     
-    reference_gdf = targeted_areas.copy()
-
-    buffer_amenity = poi_gdf.buffer(search_distance).unary_union
-    reference_gdf["access_flag"] = buffer_amenity.intersects(reference_gdf.geometry.representative_point())
-    # Identify 
-    candidate_areas = reference_gdf[reference_gdf["access_flag"] == False].copy()
-
-    if method == "cluster":
-        spatial_weights = libpysal.weights.Rook.from_dataframe(candidate_areas, use_index=True)
-
-            # This code collects the sum of every grouping identified before. It iterates through the list of index values, subsets the dataframe, and sums the < 18 population field for that subset.
-        totals_dict = {}
-        for reference_area in spatial_weights.neighbors.items():
-            reference_idx =reference_area[0]
-            neighboring_ids = reference_area[1]
-            cluster_pop = candidate_areas.loc[[reference_idx]+neighboring_ids][weight_col].sum()
-            # Create new key-value storing that block groups sum
-            totals_dict[reference_idx] = cluster_pop
-        max_idx = max(totals_dict, key=totals_dict.get)
-        return {"optimal_idx": [max_idx], "added": [max_idx]+spatial_weights.neighbors[max_idx], "total_gain": totals_dict[max_idx]}
-    elif method == "brute":
-        totals_dict = {}
-        neighbors = {}
-        for id in candidate_areas.index.to_list():
-            candidate_center = candidate_areas.loc[id].geometry.representative_point()
-            expansion_zone = candidate_center.buffer(search_distance)
-            added_idxs = candidate_areas[candidate_areas.intersects(expansion_zone)].index.to_list()
-            neighbors[id] = added_idxs
-            cluster_pop = candidate_areas.loc[[id]+added_idxs][weight_col].sum()
-            totals_dict[id] = cluster_pop
-        max_idx = max(totals_dict, key=totals_dict.get)
-        return {"optimal_idx": [max_idx], "added": neighbors[max_idx]+[max_idx], "total_gain": totals_dict[max_idx]}
+    with stage("optimal_single_location", rows=targeted_areas.shape[0], method=method):
+        reference_gdf = targeted_areas.copy()
+
+        buffer_amenity = poi_gdf.buffer(search_distance).unary_union
+        reference_gdf["access_flag"] = buffer_amenity.intersects(reference_gdf.geometry.representative_point())
+        # Identify 
+        candidate_areas = reference_gdf[reference_gdf["access_flag"] == False].copy()
+
+        if method == "cluster":
+            spatial_weights = libpysal.weights.Rook.from_dataframe(candidate_areas, use_index=True)
+
+                # This code collects the sum of every grouping identified before. It iterates through the list of index values, subsets the dataframe, and sums the < 18 population field for that subset.
+            totals_dict = {}
+            for reference_area in spatial_weights.neighbors.items():
+                reference_idx =reference_area[0]
+                neighboring_ids = reference_area[1]
+                cluster_pop = candidate_areas.loc[[reference_idx]+neighboring_ids][weight_col].sum()
+                # Create new key-value storing that block groups sum
+                totals_dict[reference_idx] = cluster_pop
+            max_idx = max(totals_dict, key=totals_dict.get)
+            return {"optimal_idx": [max_idx], "added": [max_idx]+spatial_weights.neighbors[max_idx], "total_gain": totals_dict[max_idx]}
+        elif method == "brute":
+            totals_dict = {}
+            neighbors = {}
+            for id in candidate_areas.index.to_list():
+                candidate_center = candidate_areas.loc[id].geometry.representative_point()
+                expansion_zone = candidate_center.buffer(search_distance)
+                added_idxs = candidate_areas[candidate_areas.intersects(expansion_zone)].index.to_list()
+                neighbors[id] = added_idxs
+                cluster_pop = candidate_areas.loc[[id]+added_idxs][weight_col].sum()
+                totals_dict[id] = cluster_pop
+            max_idx = max(totals_dict, key=totals_dict.get)
+            return {"optimal_idx": [max_idx], "added": neighbors[max_idx]+[max_idx], "total_gain": totals_dict[max_idx]}
     
 
 def arcgisquery_to_geodataframe(query_result, crs=None):
@@ -249,9 +292,14 @@ def arcgisquery_to_geodataframe(query_result, crs=None):
     else:
         epsg = fs_epsg
     epsg_str = f"EPSG:{epsg}"
-    gdf = gpd.read_file(query_result.to_geojson, driver="GeoJSON", crs=epsg_str)
-    shapes = list(map(lambda geom: geom.WKT if geom else None, query_result.df['SHAPE']))
-    new_shapes = [shapely.validation.make_valid(shapely.from_wkt(shape)) for shape in shapes]
-    new_geoseries = gpd.GeoSeries(new_shapes, crs=epsg_str)
-    gdf = gdf.set_geometry(new_geoseries)
+    with stage("arcgisquery_to_geodataframe"):
+        with stage("read_geojson") as s:
+            geojson = query_result.to_geojson
+            gdf = gpd.read_file(geojson, driver="GeoJSON", crs=epsg_str)
+            s.add(rows=gdf.shape[0], geojson_bytes=len(geojson))
+        with stage("make_valid", rows=gdf.shape[0]):
+            shapes = list(map(lambda geom: geom.WKT if geom else None, query_result.df['SHAPE']))
+            new_shapes = [shapely.validation.make_valid(shapely.from_wkt(shape)) for shape in shapes]
+            new_geoseries = gpd.GeoSeries(new_shapes, crs=epsg_str)
+        gdf = gdf.set_geometry(new_geoseries)
     return gdf